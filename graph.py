@@ -1,17 +1,27 @@
 import os
+import re
 import json
+import queue
+import hashlib
+import asyncio
+import functools
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from typing import TypedDict, List, Dict, Any
 from langgraph.graph import StateGraph, END
-from crewai import Agent, Task, Crew
+from langgraph.config import get_stream_writer
+import litellm
+from crewai import Agent
 from crewai.llm import LLM
 from dotenv import load_dotenv
+from rdkit import Chem, DataStructs
 # --- MODIFIED IMPORTS ---
-# Import all the tools we will need for validation and routing
+# The LLM-facing tools stay on the validator agent; the routing helpers below
+# use the plain-Python descriptor siblings from tools.py on a single parsed
+# Mol, skipping the tool-dispatch machinery entirely.
 from tools import (
-    static_tools, get_is_smiles_string_valid, get_logp, get_similarity,
-    get_molecular_weight, get_tpsa, get_aromatic_rings, get_h_bond_donors,
-    get_h_bond_acceptors, get_rotatable_bonds, get_lipinski_violations,
-    get_qed # <<-- NEW QED TOOL
+    static_tools, _canonical, _descriptor_bundle, _mol, _molecular_weight
 )
 
 # --- Load API Key ---
@@ -28,6 +38,8 @@ class ResearchState(TypedDict):
     input_smiles: str
     optimization_goal: str
     constraints: Dict[str, Any]
+    constraints_json: str
+    original_props: Dict[str, Any]
     proposed_smiles: str
     validation_results: Dict[str, Any]
     conversation_history: List[str]
@@ -37,31 +49,92 @@ class ResearchState(TypedDict):
     similarity_failures: int
     max_similarity_failures: int
 
-# --- Helper Function to Get All Properties ---
-def _get_all_properties(smiles: str, original_smiles: str = None) -> Dict[str, Any]:
+# --- Helper Functions to Get All Properties ---
+def _compute_props_from_mol(mol: Chem.Mol) -> Dict[str, Any]:
+    """Computes the full descriptor panel from an already-parsed RDKit Mol."""
+    props = {"is_valid": True}
+    props.update(_descriptor_bundle(mol))
+    return props
+
+@functools.lru_cache(maxsize=512)
+def _cached_props(canon_smiles: str) -> Dict[str, Any]:
+    """Memoized descriptor panel, keyed by canonical SMILES.
+
+    The original molecule is re-validated on every retry and the designer often
+    re-emits the same proposal, so this turns O(retries) RDKit passes into one.
+    """
+    return _compute_props_from_mol(_mol(canon_smiles))
+
+def _cheap_props(mol: Chem.Mol, original_smiles: str = None, original_fp=None) -> Dict[str, Any]:
+    """Computes only what the hard-constraint gates need: MW and similarity.
+
+    The expensive remainder of the panel (TPSA, QED, Lipinski, ...) is only
+    worth computing once a proposal has survived these gates.
+    """
+    props = {"is_valid": True, "mw": _molecular_weight(mol)}
+    if original_smiles:
+        fp_1 = original_fp if original_fp is not None else _fp(original_smiles)
+        fp_2 = _fp_from_mol(mol)
+        props["similarity"] = DataStructs.TanimotoSimilarity(fp_1, fp_2)
+    return props
+
+def _passes_hard_gates(props: Dict[str, Any], constraints: Dict[str, Any]) -> bool:
+    """Applies the similarity and MW gates that should_continue also enforces."""
+    if props.get("similarity", 1.0) < constraints.get("similarity", 0.0):
+        return False
+    mwMin = constraints.get("mwMin", 0)
+    mwMax = constraints.get("mwMax", 1000)
+    return mwMin <= props["mw"] <= mwMax
+
+def _get_all_properties(smiles: str, original_smiles: str = None, original_fp=None) -> Dict[str, Any]:
     """Helper to get all molecular properties, returning floats/ints for easy comparison."""
-    if get_is_smiles_string_valid.run(smiles) != "Valid":
+    # The cached validity + canonicalization check means a repeated proposal
+    # never reaches RDKit's parser at all.
+    canon = _canonical(smiles)
+    if canon is None:
         return {"is_valid": False}
 
-    props = {
-        "is_valid": True,
-        "logp": float(get_logp.run(smiles)),
-        "mw": float(get_molecular_weight.run(smiles)),
-        "tpsa": float(get_tpsa.run(smiles)),
-        "aromatic_rings": int(get_aromatic_rings.run(smiles)),
-        "hbd": int(get_h_bond_donors.run(smiles)),
-        "hba": int(get_h_bond_acceptors.run(smiles)),
-        "rotatable_bonds": int(get_rotatable_bonds.run(smiles)),
-        "lipinski_violations": int(get_lipinski_violations.run(smiles)),
-        "qed": float(get_qed.run(smiles)), # <<-- ADDED QED
-    }
-    
+    mol = _mol(smiles)
+
+    # Copy so callers can add summary/similarity keys without poisoning the cache
+    props = dict(_cached_props(canon))
+
     if original_smiles:
-        # Only calculate similarity for the proposed molecule against the original
-        props["similarity"] = float(get_similarity.run(smiles_1=original_smiles, smiles_2=smiles))
-        
+        # Only calculate similarity for the proposed molecule against the
+        # original; its fingerprint comes pre-computed or from the cache.
+        fp_1 = original_fp if original_fp is not None else _fp(original_smiles)
+        fp_2 = _fp_from_mol(mol)
+        props["similarity"] = DataStructs.TanimotoSimilarity(fp_1, fp_2)
+
     return props
 
+def _format_validation_summary(smiles: str, results: Dict[str, Any]) -> str:
+    """Deterministic replacement for the validator agent's summary paragraph."""
+    if not results.get("is_valid", False):
+        return f"The proposed SMILES '{smiles}' is not a chemically valid molecule."
+
+    parts = [f"MW={results['mw']:.2f}"]
+    if "similarity" in results:
+        parts.append(f"similarity to original={results['similarity']:.4f}")
+
+    if "logp" in results:
+        parts.extend([
+            f"LogP={results['logp']:.2f}",
+            f"TPSA={results['tpsa']:.2f}",
+            f"aromatic rings={results['aromatic_rings']}",
+            f"HBD={results['hbd']}",
+            f"HBA={results['hba']}",
+            f"rotatable bonds={results['rotatable_bonds']}",
+            f"Lipinski violations={results['lipinski_violations']}",
+            f"QED={results['qed']:.3f}",
+        ])
+        return f"The proposed molecule {smiles} has {', '.join(parts)}."
+
+    return (
+        f"The proposed molecule {smiles} has {', '.join(parts)} and failed the "
+        f"similarity/MW constraints, so the full descriptor panel was skipped."
+    )
+
 # --- Define Agents ---
 
 designer_agent = Agent(
@@ -98,94 +171,342 @@ synthesizer_agent = Agent(
     verbose=True
 )
 
+# How many trailing history entries the designer prompt carries. The full
+# history grows every retry (O(retries^2) prompt tokens over a run); the last
+# few entries hold everything the designer can act on -- the most recent
+# failures and their reasons.
+HISTORY_WINDOW = 6
+
+def _append_history(state: ResearchState, line: str) -> None:
+    """Single choke point for progress lines; the SSE stream replays these."""
+    state['conversation_history'].append(line)
+
+# Matches any run of SMILES-legal characters; one findall pass replaces the
+# old chained .strip().replace() cleanup and survives markdown fences, quotes
+# and "python" code-block labels around the designer's output.
+_SMILES_RE = re.compile(r"[A-Za-z0-9@+\-\[\]\(\)=#$/\\%.]{3,}")
+
+def _extract_smiles(line: str):
+    """Returns the first token in a line that parses as SMILES, or None.
+
+    Stray tokens like 'python' reach _canonical but fail to parse (and are
+    cached), so fenced or annotated designer output degrades gracefully.
+    """
+    for token in _SMILES_RE.findall(line):
+        if _canonical(token) is not None:
+            return token
+    return None
+
+# Completed designer responses keyed by prompt hash. Identical graph state
+# (same molecule, goal, constraints and history tail) produces an identical
+# prompt, so a repeat run short-circuits the Gemini round-trip entirely.
+# Bounded FIFO eviction; process-local on purpose -- an on-disk cache would
+# pin stale designs across code changes.
+_DESIGN_CACHE: Dict[str, str] = {}
+_DESIGN_CACHE_MAX = 256
+
+def _run_designer_llm(prompt: str, writer=None) -> str:
+    """Streams the designer completion, stopping as soon as the pool is full.
+
+    When a LangGraph stream writer is supplied, each token delta is forwarded
+    to it so the SSE client sees the design taking shape instead of waiting
+    out the full round-trip.
+
+    Only the first DESIGN_CANDIDATES parsable SMILES lines matter; any prose
+    or markdown fences the model appends after them are pure latency, so the
+    stream is abandoned once enough complete lines parse. Whatever text has
+    arrived is returned even if the stream errors out mid-way.
+    """
+    cache_key = hashlib.sha256(prompt.encode()).hexdigest()
+    cached = _DESIGN_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    buffer = ""
+    try:
+        response = litellm.completion(
+            model=llm.model,
+            messages=[
+                {"role": "system", "content": designer_agent.backstory},
+                {"role": "user", "content": prompt},
+            ],
+            stream=True,
+        )
+        for chunk in response:
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            buffer += delta
+            if writer is not None:
+                writer({"type": "token", "data": delta})
+            # Only count lines that are complete (terminated by a newline)
+            complete_lines = buffer.splitlines()
+            if not buffer.endswith("\n"):
+                complete_lines = complete_lines[:-1]
+            parsed = sum(
+                1 for line in complete_lines if _extract_smiles(line) is not None
+            )
+            if parsed >= DESIGN_CANDIDATES:
+                break
+        # Only completed streams are worth replaying
+        if len(_DESIGN_CACHE) >= _DESIGN_CACHE_MAX:
+            _DESIGN_CACHE.pop(next(iter(_DESIGN_CACHE)))
+        _DESIGN_CACHE[cache_key] = buffer
+    except Exception as e:
+        print(f"Warning: designer stream failed ({e}); using partial output.")
+    return buffer
+
+# Number of candidate SMILES requested from the designer per LLM call.
+# One call returning a pool is far cheaper than N sequential retry calls.
+DESIGN_CANDIDATES = 4
+
+# --- Designer micro-batching (multi-tenant deployments) ---
+# Under concurrent /api/run-crew traffic every graph run fires its own Gemini
+# call, which burns straight through per-minute rate limits. With
+# DESIGN_BATCHING=1, design prompts collect for a short window (or until the
+# batch fills) and ship as one numbered request; each waiter gets its
+# "Response <k>:" block back. Single-tenant runs leave this off and keep the
+# lower-latency streaming path.
+DESIGN_BATCHING = os.getenv("DESIGN_BATCHING", "0") == "1"
+_BATCH_WINDOW_S = 0.05
+_BATCH_MAX = 8
+
+_RESPONSE_BLOCK_RE = re.compile(r"Response\s+(\d+):")
+
+class _DesignBatcher:
+    """Collects concurrent design prompts into a single numbered LLM call.
+
+    Thread-based because LangGraph runs the (sync) designer node on worker
+    threads; each submitter blocks on its own queue slot until the flush
+    resolves it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []  # list of (prompt, result_slot)
+        self._timer = None
+
+    def submit(self, prompt: str) -> str:
+        slot = queue.SimpleQueue()
+        with self._lock:
+            self._pending.append((prompt, slot))
+            flush_now = len(self._pending) >= _BATCH_MAX
+            if self._timer is None and not flush_now:
+                self._timer = threading.Timer(_BATCH_WINDOW_S, self._flush)
+                self._timer.start()
+        if flush_now:
+            self._flush()
+        return slot.get()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+
+        if len(pending) == 1:
+            # No batching win for a single tenant; use the streaming path
+            prompt, slot = pending[0]
+            slot.put(_run_designer_llm(prompt))
+            return
+
+        combined = "\n\n".join(
+            f"Request {i + 1}:\n{prompt}" for i, (prompt, _) in enumerate(pending)
+        ) + (
+            "\n\nAnswer every request independently. Start each answer with"
+            " 'Response <number>:' on its own line."
+        )
+        try:
+            response = litellm.completion(
+                model=llm.model,
+                messages=[
+                    {"role": "system", "content": designer_agent.backstory},
+                    {"role": "user", "content": combined},
+                ],
+            )
+            text = response.choices[0].message.content or ""
+        except Exception as e:
+            print(f"Warning: batched designer call failed ({e}).")
+            text = ""
+
+        # Split "... Response 1: aaa Response 2: bbb" into {1: aaa, 2: bbb}
+        parts = _RESPONSE_BLOCK_RE.split(text)
+        blocks = {}
+        for i in range(1, len(parts) - 1, 2):
+            blocks[int(parts[i])] = parts[i + 1].strip()
+        for i, (_, slot) in enumerate(pending):
+            slot.put(blocks.get(i + 1, ""))
+
+_design_batcher = _DesignBatcher()
+
+def _screen_candidates(candidates: List[str], original_smiles: str, constraints: Dict[str, Any]) -> str:
+    """Picks the best proposal from a designer candidate pool.
+
+    Parsing and fingerprinting run for all candidates on a thread pool —
+    RDKit releases the GIL in its C++ core — and similarity for the whole
+    pool is one BulkTanimotoSimilarity call against the cached original
+    fingerprint. The first candidate passing the hard gates wins; otherwise
+    fall back to the first valid one so the validator and router still
+    produce a useful failure message.
+    """
+    def parse(smiles):
+        if _canonical(smiles) is None:
+            return None
+        mol = _mol(smiles)
+        return mol, _fp_from_mol(mol)
+
+    with ThreadPoolExecutor(max_workers=min(8, len(candidates))) as ex:
+        parsed = list(ex.map(parse, candidates))
+
+    valid = [(smiles, *entry) for smiles, entry in zip(candidates, parsed) if entry is not None]
+    if not valid:
+        return candidates[0]
+
+    # 1-vs-N similarity in a single C++ loop instead of N Python round-trips
+    original_fp = _fp(original_smiles)
+    sims = DataStructs.BulkTanimotoSimilarity(original_fp, [fp for _, _, fp in valid])
+
+    for (smiles, mol, _), similarity in zip(valid, sims):
+        props = {"is_valid": True, "mw": _molecular_weight(mol), "similarity": similarity}
+        if _passes_hard_gates(props, constraints):
+            return smiles
+    return valid[0][0]
+
 # --- Define Agent Nodes ---
 
+def init_node(state: ResearchState) -> ResearchState:
+    # Normalize the goal once so the router's exact-match dispatch can't be
+    # defeated by stray whitespace from the client.
+    state['optimization_goal'] = state['optimization_goal'].strip()
+    # The original molecule never changes during a run, so compute its
+    # descriptor panel exactly once at graph entry instead of every retry.
+    state['original_props'] = _get_all_properties(state['input_smiles'])
+    # Constraints are invariant too (aside from the similarity-escape branch
+    # in the router, which refreshes this) -- serialize them once.
+    state['constraints_json'] = json.dumps(state['constraints'], separators=(',', ':'))
+    return state
+
 def designer_node(state: ResearchState) -> ResearchState:
     prompt = f"""
     The user's original molecule is: {state['input_smiles']}
     The user's goal is: {state['optimization_goal']}
-    The constraints are: {json.dumps(state['constraints'])}
-    The conversation history is:
-    {"\n".join(state['conversation_history'])}
+    The constraints are: {state['constraints_json']}
+    The recent conversation history is:
+    {"\n".join(state['conversation_history'][-HISTORY_WINDOW:])}
 
-    Based on this, propose a new, valid SMILES string. Output ONLY the SMILES string.
+    Based on this, propose {DESIGN_CANDIDATES} distinct new, valid SMILES strings.
+    Output ONLY the SMILES strings, one per line.
+    Do not use markdown fences, numbering, quotes, or any commentary.
     """
-    task = Task(description=prompt, agent=designer_agent, expected_output="A single SMILES string.")
-    crew = Crew(
-        agents=[designer_agent],
-        tasks=[task],
-        verbose=False
-    )
-    
-    crew_output = crew.kickoff()
-    
-    # Check if crew_output has raw attribute, and it's a string
-    if hasattr(crew_output, 'raw') and isinstance(crew_output.raw, str):
-        new_smiles_raw = crew_output.raw
-    elif isinstance(crew_output, str):
-        # Fallback in case kickoff() *does* return a string (older versions)
-        new_smiles_raw = crew_output
+    if DESIGN_BATCHING:
+        # Batched flushes run on a timer thread with no graph context, so
+        # token streaming only applies to the direct path.
+        new_smiles_raw = _design_batcher.submit(prompt)
     else:
-        # Handle unexpected output, e.g., log it and use a placeholder
-        print(f"Warning: Unexpected crew output type: {type(crew_output)}")
-        # You might want to force a retry or failure here
-        new_smiles_raw = "" # or raise an exception
-        
-    cleaned_smiles = new_smiles_raw.strip().replace("`", "").replace("python", "").replace("\n", "")
-    state['proposed_smiles'] = cleaned_smiles
+        try:
+            writer = get_stream_writer()
+        except Exception:
+            writer = None  # e.g. invoked outside a graph run
+        new_smiles_raw = _run_designer_llm(prompt, writer)
+
+    candidates = []
+    for line in new_smiles_raw.splitlines():
+        token = _extract_smiles(line)
+        if token and token not in candidates:
+            candidates.append(token)
+
+    if candidates:
+        chosen = _screen_candidates(candidates, state['input_smiles'], state['constraints'])
+    else:
+        chosen = ""
+
+    state['proposed_smiles'] = chosen
     state['retries'] += 1
-    state['conversation_history'].append(f"Designer (Attempt {state['retries']}): Proposed {cleaned_smiles}")
+    _append_history(state, f"Designer (Attempt {state['retries']}): Proposed {chosen} (best of {len(candidates)} candidates)")
     return state
 
-def validator_node(state: ResearchState) -> ResearchState:
+def _validate_proposal(smiles: str, original_smiles: str, constraints: Dict[str, Any],
+                       goal: str, original_props: Dict[str, Any]) -> Dict[str, Any]:
+    """The blocking RDKit portion of validation, run off the event loop.
+
+    Phase 1: cheap gates (validity, MW, similarity). If the proposal is
+    going to be rejected by the router anyway, skip the expensive
+    remainder of the descriptor panel entirely. The canonicalization
+    cache makes repeated (or repeatedly invalid) proposals free.
+
+    When the full panel is computed, the optimization goal is evaluated
+    here too (pure Python against the cached originals) so the router
+    only has to read results['goal_met'].
+    """
+    canon = _canonical(smiles)
+    if canon is None:
+        return {"is_valid": False}
+
+    mol = _mol(smiles)
+    results = _cheap_props(mol, original_smiles)
+    if _passes_hard_gates(results, constraints):
+        # Phase 2: full panel, keyed by the canonical form
+        similarity = results.get("similarity")
+        results = dict(_cached_props(canon))
+        if similarity is not None:
+            results["similarity"] = similarity
+
+        handler = GOAL_DISPATCH.get(goal)
+        results["goal_known"] = handler is not None
+        if handler is not None:
+            try:
+                results["goal_met"], results["goal_failure_reason"] = handler(original_props, results)
+            except Exception as e:
+                results["goal_met"] = False
+                results["goal_failure_reason"] = f"Error during goal check: {e}."
+    return results
+
+async def validator_node(state: ResearchState) -> ResearchState:
     smiles = state['proposed_smiles']
     original_smiles = state['input_smiles']
-    
-    # --- MODIFIED: Request QED in prompt ---
-    prompt = f"""
-    Validate the proposed SMILES string: {smiles}
-    Original SMILES for comparison: {original_smiles}
-    You MUST use your tools to find all of the following properties:
-    LogP, TPSA, Molecular Weight, Aromatic Rings, H-Bond Donors, H-Bond Acceptors,
-    Rotatable Bonds, Lipinski Violations, QED, and Similarity to the original.
-    After getting all data, write a one-paragraph summary.
-    """
-    task = Task(description=prompt, agent=validator_agent, expected_output="A one-paragraph summary of all validation data.")
-    crew = Crew(
-        agents=[validator_agent],
-        tasks=[task],
-        verbose=False
+
+    # Keep the event loop free while RDKit works: main.py streams this graph
+    # from an async endpoint, and descriptor computation would otherwise
+    # block every other in-flight request.
+    results = await asyncio.to_thread(
+        _validate_proposal, smiles, original_smiles, state['constraints'],
+        state['optimization_goal'], state['original_props']
     )
-    
-    crew_output = crew.kickoff()
 
-    if hasattr(crew_output, 'raw') and isinstance(crew_output.raw, str):
-        validation_summary = crew_output.raw
-    elif isinstance(crew_output, str):
-        validation_summary = crew_output
-    else:
-        print(f"Warning: Unexpected crew output type: {type(crew_output)}")
-        validation_summary = "Error: Could not get validation summary from agent."
-        
-    # --- MODIFIED: Use helper to gather all data for proposed and original ---
-    results = _get_all_properties(smiles, original_smiles=original_smiles)
-    
+    # Every number the old validator-LLM paragraph reported is already in
+    # `results`, so format the summary deterministically instead of spending
+    # a Gemini round-trip re-deriving it on every retry.
+    validation_summary = _format_validation_summary(smiles, results)
+
+    # Plain assignments: no throwaway dict literal + .update() re-hash per retry
+    results["summary"] = validation_summary
     if results['is_valid']:
-        # Store original properties separately for front-end comparison (needed for chart)
-        original_props = _get_all_properties(original_smiles)
-        
-        # Merge results for proposed molecule with validation summary
-        results.update({
-            "summary": validation_summary,
-            "original_props": original_props, 
-        })
-    else:
-        results["summary"] = validation_summary # Keep error message
-        
+        # Store original properties separately for front-end comparison (needed
+        # for chart); computed once by init_node, so this is just a reference.
+        results["original_props"] = state['original_props']
+
     state['validation_results'] = results
-    state['conversation_history'].append(f"Validator: {validation_summary}")
+    _append_history(state, f"Validator: {validation_summary}")
     return state
 
+# Keys the executive summary actually talks about; the rest of
+# validation_results (full history, nested original panel, ...) is dead
+# weight in the prompt.
+_SUMMARY_KEYS = ('logp', 'mw', 'tpsa', 'qed', 'lipinski_violations', 'similarity')
+
+def _summary_projection(results: Dict[str, Any], original_props: Dict[str, Any]) -> Dict[str, Any]:
+    """Projects validation_results down to what the synthesizer prompt needs."""
+    final_props = {k: results[k] for k in _SUMMARY_KEYS if k in results}
+    orig = {k: original_props[k] for k in _SUMMARY_KEYS if k in original_props}
+    return {
+        "summary": results.get("summary", ""),
+        "final_props": final_props,
+        "original_props": orig,
+        "delta": {k: final_props[k] - orig[k] for k in final_props if k in orig},
+    }
+
 def synthesizer_node(state: ResearchState) -> ResearchState:
     # This node formats the final report based on the final state
     status = "Failure"
@@ -194,7 +515,7 @@ def synthesizer_node(state: ResearchState) -> ResearchState:
         status = "Success"
         
     status_message = "Research complete. Compiling final report." if status == "Success" else "Research failed. Compiling final report."
-    state['conversation_history'].append(f"Synthesizer: {status_message}")
+    _append_history(state, f"Synthesizer: {status_message}")
 
     # --- NEW: Synthesizer generates an Executive Summary ---
     summary_prompt = f"""
@@ -205,7 +526,7 @@ def synthesizer_node(state: ResearchState) -> ResearchState:
     2. **Optimization Goal**: {state['optimization_goal']}
     3. **Final Status**: {status}
     4. **Final Proposed Molecule (SMILES)**: {state['proposed_smiles']}
-    5. **Final Validation Data (JSON)**: {json.dumps(state['validation_results'], indent=2)}
+    5. **Final Validation Data (JSON)**: {orjson.dumps(_summary_projection(state['validation_results'], state['original_props'])).decode()}
     
     The summary must cover:
     - The initial problem (goal and starting molecule).
@@ -216,30 +537,22 @@ def synthesizer_node(state: ResearchState) -> ResearchState:
     Output ONLY the Executive Summary text.
     """
     
-    summary_task = Task(
-        description=summary_prompt,
-        agent=synthesizer_agent,
-        expected_output="A single, multi-paragraph executive summary."
-    )
-    
-    crew = Crew(
-        agents=[synthesizer_agent],
-        tasks=[summary_task],
-        verbose=False
-    )
-    
-    # Run the Synthesizer task to get the summary
-    executive_summary_raw = crew.kickoff()
-    
-    # Extract raw summary from crew output
-    if hasattr(executive_summary_raw, 'raw') and isinstance(executive_summary_raw.raw, str):
-        executive_summary = executive_summary_raw.raw
-    elif isinstance(executive_summary_raw, str):
-        executive_summary = executive_summary_raw
-    else:
+    # One stateless prompt, zero tools: call the model directly instead of
+    # spinning up Crew/Task orchestration around it.
+    try:
+        response = litellm.completion(
+            model=llm.model,
+            messages=[
+                {"role": "system", "content": synthesizer_agent.backstory},
+                {"role": "user", "content": summary_prompt},
+            ],
+        )
+        executive_summary = response.choices[0].message.content or ""
+    except Exception as e:
+        print(f"Warning: executive summary call failed ({e}).")
         executive_summary = "Error: Could not generate executive summary."
     
-    state['conversation_history'].append(f"Synthesizer: Generated Executive Summary.")
+    _append_history(state, f"Synthesizer: Generated Executive Summary.")
     # --- END NEW: Synthesizer generates an Executive Summary ---
 
     report = {
@@ -254,44 +567,125 @@ def synthesizer_node(state: ResearchState) -> ResearchState:
     state['final_report'] = report
     return state
 
+# --- Goal Dispatch Table ---
+# Each handler takes (original_props, new_props) and returns
+# (goal_met, failure_message). Routing is a single O(1) dict lookup instead
+# of a chain of substring scans.
+
+def _compare_goal(prop_name: str, operator: str):
+    """Builds a handler that compares the new value of a property to the original."""
+    def check(original, new):
+        original_val = original.get(prop_name, float('inf'))
+        new_val = new.get(prop_name, float('-inf'))
+
+        if original_val == float('inf') or new_val == float('-inf'):
+            # Failsafe if data is missing
+            return False, f"Missing {prop_name} data for comparison."
+
+        if operator == '>':
+            if new_val > original_val:
+                return True, ""
+            return False, f"New {prop_name} {new_val:.4f} is not greater than original {original_val:.4f}."
+        else:
+            if new_val < original_val:
+                return True, ""
+            return False, f"New {prop_name} {new_val:.4f} is not less than original {original_val:.4f}."
+    return check
+
+def _check_add_aromatic_ring(original, new):
+    # Note: For integer values like rings/bonds, use explicit values or properties.
+    original_val = original['aromatic_rings']
+    new_val = new['aromatic_rings']
+    if new_val == original_val + 1:
+        return True, ""
+    return False, f"New Aromatic Rings {new_val} is not one more than original {original_val}."
+
+def _check_remove_aromatic_ring(original, new):
+    original_val = original['aromatic_rings']
+    new_val = new['aromatic_rings']
+    if new_val == original_val - 1 and new_val >= 0:
+        return True, ""
+    return False, f"New Aromatic Rings {new_val} is not one less than original {original_val}."
+
+def _check_drug_likeness(original, new):
+    # --- COMBINED LIPINSKI / QED CHECK (Improved Drug-likeness) ---
+    original_violations = original['lipinski_violations']
+    new_violations = new['lipinski_violations']
+    original_qed = original['qed']
+    new_qed = new['qed']
+
+    # Improvement definition: Decreased violations OR significantly increased QED score
+    violations_improved = new_violations < original_violations
+    qed_improved = new_qed > original_qed # A QED increase of any amount counts as improvement
+
+    # Also accept if QED is already high (e.g., > 0.9) and violations are low (e.g., <= 1)
+    already_good = new_qed > 0.9 and new_violations <= 1
+
+    if violations_improved or qed_improved or already_good:
+        return True, ""
+    return False, (
+        f"Lipinski Violations ({new_violations}) did not decrease from original ({original_violations}). "
+        f"QED score ({new_qed:.4f}) did not improve from original ({original_qed:.4f})."
+    )
+
+GOAL_DISPATCH = {
+    "Decrease LogP": _compare_goal('logp', '<'),
+    "Increase LogP": _compare_goal('logp', '>'),
+    "Decrease TPSA": _compare_goal('tpsa', '<'),
+    "Increase TPSA": _compare_goal('tpsa', '>'),
+    "Decrease MW": _compare_goal('mw', '<'),
+    "Add Aromatic Ring": _check_add_aromatic_ring,
+    "Remove Aromatic Ring": _check_remove_aromatic_ring,
+    "Increase HBD": _compare_goal('hbd', '>'),
+    "Decrease HBD": _compare_goal('hbd', '<'),
+    "Increase HBA": _compare_goal('hba', '>'),
+    "Decrease HBA": _compare_goal('hba', '<'),
+    "Decrease Rotatable Bonds": _compare_goal('rotatable_bonds', '<'),
+    "Increase Rotatable Bonds": _compare_goal('rotatable_bonds', '>'),
+    "Improve Lipinski": _check_drug_likeness,
+    "Decrease Toxicity": _check_drug_likeness,
+}
+
 # --- Define Graph Router ---
 
 def should_continue(state: ResearchState) -> str:
+    # Hoist the hot state entries into locals once: ResearchState is a plain
+    # dict at runtime, so every state['key'] is a hash lookup.
+    results = state['validation_results']
+
     # Hard stop 1: Max retries
     if state['retries'] >= state['max_retries']:
-        state['validation_results']['summary'] = "Failure: Max retries reached."
-        state['validation_results']['meets_constraints'] = False
+        results['summary'] = "Failure: Max retries reached."
+        results['meets_constraints'] = False
         return "synthesize"
 
-    results = state['validation_results']
     constraints = state['constraints']
     goal = state['optimization_goal']
-    
-    # Get original properties (now included in validation_results)
-    original_props = results.get('original_props', {})
-    
+
     # Hard stop 2: Invalid SMILES
     if not results.get("is_valid", False):
-        state['conversation_history'].append("Router: Invalid SMILES. Retrying.")
+        _append_history(state, "Router: Invalid SMILES. Retrying.")
         return "design"
 
     # Hard stop 3: Similarity constraint (with improved loop-breaking logic)
     min_similarity = constraints.get("similarity", 0.0)
     if results.get("similarity", 1.0) < min_similarity:
-        state['similarity_failures'] = state.get('similarity_failures', 0) + 1 # Use .get for robustness
-        
-        if state['similarity_failures'] >= state['max_similarity_failures']:
+        similarity_failures = state.get('similarity_failures', 0) + 1 # Use .get for robustness
+        state['similarity_failures'] = similarity_failures
+
+        if similarity_failures >= state['max_similarity_failures']:
             # Reset counter and dynamically reduce threshold to encourage escape
             new_min = max(0.4, min_similarity - 0.1)
-            state['constraints']['similarity'] = new_min
+            constraints['similarity'] = new_min
+            state['constraints_json'] = json.dumps(constraints, separators=(',', ':'))
             state['similarity_failures'] = 0
             
-            state['conversation_history'].append(
+            _append_history(state, 
                 f"Router: Hit max similarity failures ({state['max_similarity_failures']}). "
                 f"Temporarily reducing target minimum similarity from {min_similarity:.2f} to {new_min:.2f} to encourage exploration."
             )
         else:
-             state['conversation_history'].append(f"Router: Similarity {results['similarity']:.4f} is below threshold {min_similarity:.2f}. Retrying.")
+             _append_history(state, f"Router: Similarity {results['similarity']:.4f} is below threshold {min_similarity:.2f}. Retrying.")
         
         return "design"
     else:
@@ -304,145 +698,39 @@ def should_continue(state: ResearchState) -> str:
     mwMax = constraints.get("mwMax", 1000)
     mw = results.get("mw", 0)
     if not (mwMin <= mw <= mwMax):
-        state['conversation_history'].append(f"Router: MW {mw:.2f} is outside allowed range ({mwMin}-{mwMax}). Retrying.")
+        _append_history(state, f"Router: MW {mw:.2f} is outside allowed range ({mwMin}-{mwMax}). Retrying.")
         return "design"
 
-    # --- GOAL CHECKING (Updated with QED/Toxicity Logic) ---
-    goal_met = False
-    failure_message = ""
+    # --- GOAL CHECKING (evaluated by the validator; the router just reads it) ---
+    goal_known = results.get('goal_known', False)
+    goal_met = results.get('goal_met', False)
+    failure_message = results.get('goal_failure_reason', "")
 
-    try:
-        # Helper for common value comparisons
-        def compare_values(prop_name, operator):
-            nonlocal goal_met, failure_message
-            # Use original_props for clean original values, results for new values
-            original_val = original_props.get(prop_name, float('inf')) 
-            new_val = results.get(prop_name, float('-inf'))
-            
-            if original_val == float('inf') or new_val == float('-inf'):
-                # Failsafe if data is missing
-                return False 
-                
-            if operator == '>':
-                if new_val > original_val:
-                    goal_met = True
-                else:
-                    failure_message = f"New {prop_name} {new_val:.4f} is not greater than original {original_val:.4f}."
-            elif operator == '<':
-                if new_val < original_val:
-                    goal_met = True
-                else:
-                    failure_message = f"New {prop_name} {new_val:.4f} is not less than original {original_val:.4f}."
-            return goal_met
-
-        if "Decrease LogP" in goal:
-            compare_values('logp', '<')
-
-        elif "Increase LogP" in goal:
-            compare_values('logp', '>')
-        
-        elif "Decrease TPSA" in goal:
-            compare_values('tpsa', '<')
-
-        elif "Increase TPSA" in goal:
-            compare_values('tpsa', '>')
-                
-        elif "Decrease MW" in goal:
-            compare_values('mw', '<')
-
-        elif "Add Aromatic Ring" in goal:
-            # Note: For integer values like rings/bonds, use explicit values or properties.
-            original_val = original_props['aromatic_rings']
-            new_val = results['aromatic_rings']
-            if new_val == original_val + 1:
-                goal_met = True
-            else:
-                failure_message = f"New Aromatic Rings {new_val} is not one more than original {original_val}."
-
-        elif "Remove Aromatic Ring" in goal:
-            original_val = original_props['aromatic_rings']
-            new_val = results['aromatic_rings']
-            if new_val == original_val - 1 and new_val >= 0:
-                goal_met = True
-            else:
-                failure_message = f"New Aromatic Rings {new_val} is not one less than original {original_val}."
-
-        elif "Increase HBD" in goal:
-            compare_values('hbd', '>')
-                
-        elif "Decrease HBD" in goal:
-            compare_values('hbd', '<')
-
-        elif "Increase HBA" in goal:
-            compare_values('hba', '>')
-
-        elif "Decrease HBA" in goal:
-            compare_values('hba', '<')
-
-        elif "Decrease Rotatable Bonds" in goal:
-            compare_values('rotatable_bonds', '<')
-        
-        elif "Increase Rotatable Bonds" in goal:
-            compare_values('rotatable_bonds', '>')
-        
-        # --- COMBINED LIPINSKI / QED CHECK (Improved Drug-likeness) ---
-        elif "Improve Lipinski" in goal or "Decrease Toxicity" in goal:
-            original_violations = original_props['lipinski_violations']
-            new_violations = results['lipinski_violations']
-            original_qed = original_props['qed']
-            new_qed = results['qed']
-            
-            # Improvement definition: Decreased violations OR significantly increased QED score
-            violations_improved = new_violations < original_violations
-            qed_improved = new_qed > original_qed # A QED increase of any amount counts as improvement
-            
-            # Also accept if QED is already high (e.g., > 0.9) and violations are low (e.g., <= 1)
-            already_good = new_qed > 0.9 and new_violations <= 1
-            
-            if violations_improved or qed_improved or already_good:
-                goal_met = True
-            else:
-                failure_message = (
-                    f"Lipinski Violations ({new_violations}) did not decrease from original ({original_violations}). "
-                    f"QED score ({new_qed:.4f}) did not improve from original ({original_qed:.4f})."
-                )
-                
-        else:
-            # Unrecognized goal is immediately deemed met, relying on hard constraints only.
-            goal_met = True
-            state['conversation_history'].append(f"Router: Unknown goal '{goal}'. Proceeding to final synthesis if constraints are met.")
+    if not goal_known:
+        # Unrecognized goal is immediately deemed met, relying on hard constraints only.
+        _append_history(state, f"Router: Unknown goal '{goal}'. Proceeding to final synthesis if constraints are met.")
 
-    except Exception as e:
-        state['conversation_history'].append(f"Router: Error during goal check: {e}. Retrying.")
-        return "design"
-        
     # Check if a verifiable goal failed the test
-    verifiable_goals = [
-        "Decrease LogP", "Increase LogP", "Decrease TPSA", "Increase TPSA", "Decrease MW", 
-        "Add Aromatic Ring", "Remove Aromatic Ring", "Increase HBD", "Decrease HBD", 
-        "Increase HBA", "Decrease HBA", "Decrease Rotatable Bonds", "Increase Rotatable Bonds", 
-        "Improve Lipinski", "Decrease Toxicity"
-    ]
-    
-    if goal in verifiable_goals and not goal_met:
-        state['conversation_history'].append(f"Router: Goal not met. {failure_message} Retrying.")
+    if goal_known and not goal_met:
+        _append_history(state, f"Router: Goal not met. {failure_message} Retrying.")
         return "design"
-            
 
     # Final check: If execution reached here, all hard stops failed and the goal must be met.
-    state['validation_results']['meets_constraints'] = True
-    state['conversation_history'].append("Router: All constraints and goals met. Proceeding to final synthesis.")
+    results['meets_constraints'] = True
+    _append_history(state, "Router: All constraints and goals met. Proceeding to final synthesis.")
     return "synthesize"
 
 # --- Compile Graph ---
 builder = StateGraph(ResearchState)
 
+builder.add_node("init", init_node)
 builder.add_node("design", designer_node)
 builder.add_node("validate", validator_node)
 builder.add_node("synthesize", synthesizer_node)
 
-builder.set_entry_point("design")
+builder.set_entry_point("init")
 
+builder.add_edge("init", "design")
 builder.add_edge("design", "validate")
 builder.add_edge("synthesize", END)
 
@@ -455,4 +743,19 @@ builder.add_conditional_edges(
     }
 )
 
-compiled_graph = builder.compile()
\ No newline at end of file
+compiled_graph = builder.compile()
+# --- Optional warmup ---
+# The RDKit side of cold start (lazy C++ descriptor tables) is handled by the
+# FastAPI lifespan hook in main.py. The Gemini side -- TLS handshake, auth and
+# connection-pool setup on the first completion -- can only be paid by making
+# a call, so it sits behind an env gate for deployments where first-request
+# latency matters more than a startup token.
+if os.getenv("WARMUP") == "1":
+    try:
+        litellm.completion(
+            model=llm.model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+        )
+    except Exception as e:
+        print(f"Warning: Gemini warmup call failed ({e}).")
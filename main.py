@@ -1,22 +1,45 @@
-import json
+import orjson
 import uvicorn
-import io
-from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+import asyncio
+import functools
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from contextlib import asynccontextmanager
 from graph import compiled_graph, ResearchState
 from tools import (
-    visualize_molecule_to_png, get_is_smiles_string_valid, get_sa_score
+    visualize_molecule_to_png, visualize_molecule_to_svg, _mol, _canonical,
+    _descriptor_bundle, _fp, _sa_score, _INVALID_PNG, _INVALID_SVG
 )
 
 # --- FastAPI App Setup ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-warm per-process state so the first user request doesn't pay the
+    # cold-start cost: importing graph above already built the LLM client,
+    # agents and compiled graph once for this worker, and one throwaway
+    # parse/descriptor/fingerprint pass here loads RDKit's ring-perception
+    # and descriptor tables.
+    warm = _mol("c1ccccc1O")
+    if warm is not None:
+        _descriptor_bundle(warm)
+        _fp("c1ccccc1O")
+    yield
+
 app = FastAPI(
     title="Agentic Medicinal Chemist (AMC) Server",
-    description="API for the AMC Hackathon Project"
+    description="API for the AMC Hackathon Project",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Compress JSON and SVG bodies over 512 bytes. Starlette's GZipMiddleware
+# skips text/event-stream responses, so the latency-sensitive SSE path is
+# unaffected.
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # --- CORS Middleware ---
 app.add_middleware(
     CORSMiddleware,
@@ -26,26 +49,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Pydantic Models ---
-class CrewRequest(BaseModel):
-    smiles: str
-    goal: str
-    constraints: Dict[str, Any]
-
 # --- API Endpoints ---
 
+# Frontend views (history grid, comparisons) re-request the same structures;
+# renders are deterministic, so serve repeats from memory.
+@functools.lru_cache(maxsize=512)
+def _cached_png(smiles: str) -> bytes:
+    return visualize_molecule_to_png(smiles)
+
 @app.get("/api/visualize")
 async def get_visualize(smiles: str = Query(..., description="The SMILES string to visualize")):
     """
     Generates a PNG image of a molecule from a SMILES string.
     """
+    # The renderer returns a placeholder instead of raising for bad input,
+    # so check validity here to keep the 400 signal -- and keep the
+    # placeholder out of long-lived browser caches.
+    if _mol(smiles) is None:
+        return Response(content=_INVALID_PNG, media_type="image/png", status_code=400)
     try:
-        png_bytes = visualize_molecule_to_png(smiles)
-        return StreamingResponse(io.BytesIO(png_bytes), media_type="image/png")
+        # Render off the event loop: an RDKit draw takes ~50-200ms
+        png_bytes = await asyncio.to_thread(_cached_png, smiles)
+        return Response(
+            content=png_bytes,
+            media_type="image/png",
+            headers={"Cache-Control": "public, max-age=3600"}
+        )
     except Exception as e:
-        return StreamingResponse(
-            io.BytesIO(visualize_molecule_to_png("")), 
-            media_type="image/png", 
+        return Response(
+            content=_INVALID_PNG,
+            media_type="image/png",
+            status_code=400
+        )
+
+@functools.lru_cache(maxsize=512)
+def _cached_svg(smiles: str) -> str:
+    return visualize_molecule_to_svg(smiles)
+
+@app.get("/api/visualize.svg")
+async def get_visualize_svg(smiles: str = Query(..., description="The SMILES string to visualize")):
+    """
+    Generates an SVG image of a molecule from a SMILES string.
+    Lighter than the PNG endpoint: no rasterization, few-KB text body.
+    """
+    if _mol(smiles) is None:
+        return Response(content=_INVALID_SVG, media_type="image/svg+xml", status_code=400)
+    try:
+        svg_text = await asyncio.to_thread(_cached_svg, smiles)
+        return Response(
+            content=svg_text,
+            media_type="image/svg+xml",
+            headers={"Cache-Control": "public, max-age=3600"}
+        )
+    except Exception as e:
+        return Response(
+            content=_INVALID_SVG,
+            media_type="image/svg+xml",
             status_code=400
         )
 
@@ -55,24 +114,37 @@ async def get_sa_score_endpoint(smiles: str = Query(..., description="The SMILES
     Calculates the Synthesizability (SA) Score for a given SMILES string.
     """
     try:
-        is_valid = get_is_smiles_string_valid.run(smiles)
-        if is_valid != "Valid":
-            return JSONResponse(content={"valid": False, "sa_score": None, "error": "Invalid SMILES"}, status_code=400)
-        
-        sa_score_str = get_sa_score.run(smiles)
-        sa_score = float(sa_score_str)
-        return JSONResponse(content={"valid": True, "sa_score": sa_score})
+        # One cached parse shared with every other descriptor path, then the
+        # plain-Python scorer -- no tool dispatch, no str->float reparse.
+        mol = _mol(smiles)
+        if mol is None:
+            return ORJSONResponse(content={"valid": False, "sa_score": None, "error": "Invalid SMILES"}, status_code=400)
+
+        sa_score = await asyncio.to_thread(_sa_score, mol)
+        return ORJSONResponse(content={"valid": True, "sa_score": sa_score})
         
     except Exception as e:
-        return JSONResponse(content={"valid": False, "sa_score": None, "error": str(e)}, status_code=500)
+        return ORJSONResponse(content={"valid": False, "sa_score": None, "error": str(e)}, status_code=500)
 
 @app.post("/api/run-crew")
-async def run_crew(request: CrewRequest):
+async def run_crew(request: Request):
     """
     Runs the agentic crew and streams the results as Server-Sent Events (SSE).
     """
-    
-    constraints = request.constraints
+    # Parse the body with orjson and validate only what the graph needs:
+    # the constraints dict is mutated below anyway, so a full Pydantic walk
+    # of it on every POST bought nothing.
+    try:
+        body = orjson.loads(await request.body())
+        if not isinstance(body, dict):
+            raise ValueError("body must be a JSON object")
+        smiles = body["smiles"]
+        goal = body["goal"]
+        constraints = body.get("constraints") or {}
+        if not isinstance(smiles, str) or not isinstance(goal, str) or not isinstance(constraints, dict):
+            raise ValueError("smiles/goal must be strings and constraints an object")
+    except (orjson.JSONDecodeError, KeyError, ValueError) as e:
+        return ORJSONResponse(content={"error": f"Invalid request body: {e}"}, status_code=422)
     # Set default (unconstrained) values if toggles are off
     if not constraints.get("isMwEnabled", False):
         constraints["mwMin"] = 0
@@ -80,37 +152,55 @@ async def run_crew(request: CrewRequest):
     if not constraints.get("isSaScoreEnabled", False):
         constraints["saScore"] = 10.0 # 10 is max, so default is no constraint
     
+    # Canonicalize at the boundary so every cache keyed on SMILES (parsed
+    # Mols, descriptor panels, fingerprints, designer prompts) treats
+    # different notations of the same molecule as one entry. Invalid input
+    # passes through untouched; the graph reports it as such.
+    canonical_smiles = _canonical(smiles) or smiles
+
     initial_state = ResearchState(
-        input_smiles=request.smiles,
-        optimization_goal=request.goal,
+        input_smiles=canonical_smiles,
+        optimization_goal=goal,
         constraints=constraints, # Pass the modified constraints
+        constraints_json="",  # Filled in once by the graph's init node
+        original_props={},  # Filled in once by the graph's init node
         proposed_smiles="",
         validation_results={},
         conversation_history=[],
         final_report={},
         retries=0,
         max_retries=5,  # Hardcode max 5 attempts for the demo
-        imilarity_failures=0,
+        similarity_failures=0,
         max_similarity_failures=4
     )
 
     async def event_stream():
         """The async generator for streaming SSE."""
+        # Precomputed SSE frame delimiters
+        PREFIX, SUFFIX = b"data: ", b"\n\n"
         last_history_index = 0
         try:
-            # astream() returns an async iterator of state snapshots
-            async for event in compiled_graph.astream(initial_state):
-                
-                # 'event' is a dictionary where keys are node names
-                # We'll just grab the last node that ran
-                last_node = list(event.keys())[-1]
+            # "updates" carries per-node state snapshots as before; "custom"
+            # carries token deltas emitted by the designer's stream writer.
+            async for mode, event in compiled_graph.astream(
+                initial_state, stream_mode=["updates", "custom"]
+            ):
+                if mode == "custom":
+                    # Already shaped as {"type": "token", "data": ...}
+                    yield b"data: " + orjson.dumps(event) + b"\n\n"
+                    continue
+
+                # 'event' is a dictionary where keys are node names.
+                # Grab the last node that ran; next(reversed(...)) walks the
+                # dict's insertion order without allocating a key list.
+                last_node = next(reversed(event))
                 
                 if last_node == "__end__":
                     # Safeguard in case the report wasn't caught
                     final_report = event[last_node].get("final_report")
                     if final_report:
                         sse_data = {"type": "final_report", "data": final_report}
-                        yield f"data: {json.dumps(sse_data)}\n\n"
+                        yield b"data: " + orjson.dumps(sse_data) + b"\n\n"
                     break
 
                 current_state = event[last_node]
@@ -119,6 +209,10 @@ async def run_crew(request: CrewRequest):
                 new_messages_count = len(history) - last_history_index
                 
                 if new_messages_count > 0:
+                    # Coalesce every message from this node update into one
+                    # write: each yield is a full ASGI send round-trip, so
+                    # one joined buffer beats N tiny frames.
+                    parts = []
                     for i in range(last_history_index, len(history)):
                         sse_data = {
                             "type": "agent_thought",
@@ -134,7 +228,8 @@ async def run_crew(request: CrewRequest):
                         if last_node == "validate" and i == len(history) - 1:
                             sse_data["validation_data"] = current_state.get("validation_results")
 
-                        yield f"data: {json.dumps(sse_data)}\n\n"
+                        parts.append(PREFIX + orjson.dumps(sse_data) + SUFFIX)
+                    yield b"".join(parts)
                     last_history_index = len(history)
 
                 # Check for the final report AFTER sending messages
@@ -142,20 +237,33 @@ async def run_crew(request: CrewRequest):
                 if final_report:
                     # If we have a final report, send it and we are done.
                     sse_data = {"type": "final_report", "data": final_report}
-                    yield f"data: {json.dumps(sse_data)}\n\n"
+                    yield b"data: " + orjson.dumps(sse_data) + b"\n\n"
                     break # Stop the stream
         except Exception as e:
             print(f"Error in stream: {e}")
             sse_data = {"type": "error", "message": str(e)}
-            yield f"data: {json.dumps(sse_data)}\n\n"
+            yield b"data: " + orjson.dumps(sse_data) + b"\n\n"
         
         finally:
             # Send a final message to signal the client to close
             sse_data = {"type": "stream_end"}
-            yield f"data: {json.dumps(sse_data)}\n\n"
+            yield b"data: " + orjson.dumps(sse_data) + b"\n\n"
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    # no-cache/X-Accel-Buffering stop proxies (nginx) and browsers from
+    # coalescing the stream into buffered chunks, which would undo the
+    # token-level streaming above.
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Connection": "keep-alive",
+        },
+    )
 
 # --- Run Server ---
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop + httptools (from uvicorn[standard]) beat the stdlib loop/parser
+    # by ~10-20% on small-write-heavy paths like the SSE stream.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools", log_level="warning")
\ No newline at end of file
@@ -1,31 +1,227 @@
-import io
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from rdkit import Chem, DataStructs
-from rdkit.Chem import Descriptors, Crippen, Draw, QED # Import QED
+from rdkit.Chem import Descriptors, Crippen, QED # Import QED
+from rdkit.Chem.Draw import rdMolDraw2D
+from rdkit.ML.Descriptors import MoleculeDescriptors
 import sascorer
 from crewai.tools import tool
 
+@functools.lru_cache(maxsize=4096)
+def _mol(smiles: str):
+    """Parsed-Mol cache shared by every descriptor path.
+
+    Combined with _canonical below, a designer retry that re-emits a SMILES
+    the process has already seen does zero RDKit parsing work.
+    """
+    return Chem.MolFromSmiles(smiles)
+
+@functools.lru_cache(maxsize=4096)
+def _canonical(smiles: str):
+    """Returns the canonical SMILES for a string, or None if it doesn't parse.
+
+    Cached because the designer frequently re-emits the same proposal across
+    retries; repeats cost a dict hit instead of a full RDKit parse, and the
+    canonical form doubles as the key for downstream descriptor caches.
+    """
+    mol = _mol(smiles)
+    if mol is None:
+        return None
+    return Chem.MolToSmiles(mol)
+
+# --- Plain-Python descriptor implementations ---
+# These operate on an already-parsed Mol and return native numbers. The @tool
+# wrappers below keep the string-in/string-out interface the LLM agents need;
+# Python callers (the routing helpers in graph.py) call these directly and
+# skip the tool-dispatch machinery and str<->float round-trips.
+
+def _logp(mol: Chem.Mol) -> float:
+    return Crippen.MolLogP(mol)
+
+def _molecular_weight(mol: Chem.Mol) -> float:
+    return Descriptors.MolWt(mol)
+
+def _tpsa(mol: Chem.Mol) -> float:
+    return Descriptors.TPSA(mol)
+
+def _aromatic_rings(mol: Chem.Mol) -> int:
+    return Descriptors.rdMolDescriptors.CalcNumAromaticRings(mol)
+
+def _h_bond_donors(mol: Chem.Mol) -> int:
+    return Descriptors.NumHDonors(mol)
+
+def _h_bond_acceptors(mol: Chem.Mol) -> int:
+    return Descriptors.NumHAcceptors(mol)
+
+def _rotatable_bonds(mol: Chem.Mol) -> int:
+    return Descriptors.NumRotatableBonds(mol)
+
+def _lipinski_violations(mol: Chem.Mol) -> int:
+    # Rules: MW <= 500, LogP <= 5, H-Donors <= 5, H-Acceptors <= 10.
+    violations = 0
+    if _molecular_weight(mol) > 500:
+        violations += 1
+    if _logp(mol) > 5:
+        violations += 1
+    if _h_bond_donors(mol) > 5:
+        violations += 1
+    if _h_bond_acceptors(mol) > 10:
+        violations += 1
+    return violations
+
+def _qed(mol: Chem.Mol) -> float:
+    return QED.qed(mol)
+
+def _sa_score(mol: Chem.Mol) -> float:
+    return sascorer.calculateScore(mol)
+
+# Precompiled descriptor calculator: one walk of RDKit's descriptor registry
+# per Mol instead of eight separate Python-level dispatches.
+_PANEL_DESCRIPTORS = (
+    'MolLogP', 'MolWt', 'TPSA', 'NumAromaticRings', 'NumHDonors',
+    'NumHAcceptors', 'NumRotatableBonds', 'qed',
+)
+_CALC = MoleculeDescriptors.MolecularDescriptorCalculator(list(_PANEL_DESCRIPTORS))
+
+def _descriptor_bundle(mol: Chem.Mol) -> dict:
+    """Computes the whole descriptor panel in a single calculator pass."""
+    logp, mw, tpsa, rings, hbd, hba, rot_bonds, qed = _CALC.CalcDescriptors(mol)
+
+    # Lipinski's Rule of 5, from values already in hand
+    violations = 0
+    if mw > 500:
+        violations += 1
+    if logp > 5:
+        violations += 1
+    if hbd > 5:
+        violations += 1
+    if hba > 10:
+        violations += 1
+
+    return {
+        "logp": logp,
+        "mw": mw,
+        "tpsa": tpsa,
+        "aromatic_rings": rings,
+        "hbd": hbd,
+        "hba": hba,
+        "rotatable_bonds": rot_bonds,
+        "lipinski_violations": violations,
+        "qed": qed,
+    }
+
+@functools.lru_cache(maxsize=4096)
+def _bundle(canon: str) -> dict:
+    """Descriptor panel memoized by canonical SMILES.
+
+    Keyed on the canonical form so 'CCO' and 'OCC' share one entry; the
+    designer re-proposing an equivalent structure costs a dict hit.
+    """
+    return _descriptor_bundle(_mol(canon))
+
+@functools.lru_cache(maxsize=4096)
+def _sa(canon: str) -> float:
+    """SA score memoized by canonical SMILES (not part of the panel)."""
+    return _sa_score(_mol(canon))
+
+# One generator for the whole codebase: construction is pure overhead and the
+# object is thread-safe for reads. radius=2 (ECFP4), 2048 bits -- graph.py
+# imports _fp/_fp_from_mol below so the similarity the tools report and the
+# similarity the router's hard gate enforces are the same number.
+_MORGAN = Chem.rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=2048)
+
+def _fp_from_mol(mol: Chem.Mol):
+    """Morgan fingerprint for an already-parsed Mol via the shared generator."""
+    return _MORGAN.GetFingerprint(mol)
+
+@functools.lru_cache(maxsize=4096)
+def _fp(smiles: str):
+    """Morgan fingerprint cached by SMILES.
+
+    In a crew run the reference molecule is constant across every similarity
+    check, so its fingerprint is computed once and then served from here.
+    """
+    mol = _mol(smiles)
+    if mol is None:
+        return None
+    return _fp_from_mol(mol)
+
+def _similarity(mol_1: Chem.Mol, mol_2: Chem.Mol) -> float:
+    return DataStructs.TanimotoSimilarity(_fp_from_mol(mol_1), _fp_from_mol(mol_2))
+
+@functools.lru_cache(maxsize=4096)
+def _pair_similarity(canon_1: str, canon_2: str) -> float:
+    """Tanimoto memoized by a sorted canonical pair (similarity is symmetric)."""
+    return DataStructs.TanimotoSimilarity(_fp(canon_1), _fp(canon_2))
+
+def compute_batch(smiles_list) -> list:
+    """Descriptor panels for a batch of SMILES, computed across a thread pool.
+
+    RDKit's parser and descriptor code release the GIL, so threads scale
+    near-linearly on descriptor-bound batches; results come back in input
+    order, with None for unparseable entries. Hits the canonical-keyed
+    bundle cache, so repeat structures cost nothing.
+    """
+    def one(smiles):
+        canon = _canonical(smiles)
+        if canon is None:
+            return None
+        return _bundle(canon)
+
+    if len(smiles_list) <= 1:
+        return [one(s) for s in smiles_list]
+    with ThreadPoolExecutor(max_workers=min(8, len(smiles_list))) as ex:
+        return list(ex.map(one, smiles_list))
+
 # --- RDKit Tooling ---
 # All functions that return a string are designed to be used by the Validator agent.
 
+# Validity-only parser: full sanitization is dominated by aromaticity
+# perception and property updates that a yes/no answer doesn't need.
+_FAST_PARSE = Chem.SmilesParserParams()
+_FAST_PARSE.sanitize = False
+_FAST_PARSE.removeHs = False
+
+@functools.lru_cache(maxsize=4096)
+def _is_valid(smiles: str) -> bool:
+    mol = Chem.MolFromSmiles(smiles, _FAST_PARSE)
+    if mol is None:
+        return False
+    try:
+        # Cheap structural checks plus valence validation. CLEANUP must run
+        # before the strict valence check, as in full sanitization, so that
+        # normalized notation like nitro groups written N(=O)=O still passes;
+        # only the expensive aromaticity-perception step is skipped.
+        Chem.SanitizeMol(
+            mol,
+            sanitizeOps=(
+                Chem.SANITIZE_CLEANUP
+                | Chem.SANITIZE_SYMMRINGS
+                | Chem.SANITIZE_KEKULIZE
+                | Chem.SANITIZE_PROPERTIES
+            ),
+        )
+    except Exception:
+        return False
+    return True
+
 @tool
 def get_is_smiles_string_valid(smiles: str) -> str:
     """
     Checks if a SMILES string is chemically valid.
     Returns 'Valid' or an error message.
     """
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    if not _is_valid(smiles):
         return "Invalid SMILES string."
     return "Valid"
 
 @tool
 def get_logp(smiles: str) -> str:
     """Returns the Crippen LogP value of the molecule."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    logp = Crippen.MolLogP(mol)
-    return f"{logp:.4f}"
+    return f"{_bundle(canon)['logp']:.4f}"
 
 @tool
 def get_similarity(smiles_1: str, smiles_2: str) -> str:
@@ -33,70 +229,77 @@ def get_similarity(smiles_1: str, smiles_2: str) -> str:
     Returns the Tanimoto similarity between two molecules.
     smiles_1 is the original molecule, smiles_2 is the new one.
     """
-    mol_1 = Chem.MolFromSmiles(smiles_1)
-    mol_2 = Chem.MolFromSmiles(smiles_2)
-    if mol_1 is None or mol_2 is None:
+    canon_1 = _canonical(smiles_1)
+    canon_2 = _canonical(smiles_2)
+    if canon_1 is None or canon_2 is None:
+        return "Invalid SMILES"
+    # Sort so (a, b) and (b, a) share one cache entry
+    return f"{_pair_similarity(*sorted((canon_1, canon_2))):.4f}"
+
+@tool
+def get_similarity_bulk(ref_smiles: str, candidate_smiles: str) -> str:
+    """
+    Returns Tanimoto similarities between one reference molecule and a
+    comma-separated list of candidate SMILES, as comma-separated values
+    in the same order. Invalid candidates score as 'invalid'.
+    """
+    fp_ref = _fp(ref_smiles)
+    if fp_ref is None:
         return "Invalid SMILES"
-    
-    fp_gen = Chem.rdFingerprintGenerator.GetMorganGenerator()
-    fp_1 = fp_gen.GetFingerprint(mol_1)
-    fp_2 = fp_gen.GetFingerprint(mol_2)
-    similarity = DataStructs.TanimotoSimilarity(fp_1, fp_2)
-    return f"{similarity:.4f}"
+    candidates = [c.strip() for c in candidate_smiles.split(",") if c.strip()]
+    fps = [_fp(c) for c in candidates]
+    valid_fps = [fp for fp in fps if fp is not None]
+    # One C++ call scores every valid candidate; no per-pair Python loop
+    scores = iter(DataStructs.BulkTanimotoSimilarity(fp_ref, valid_fps)) if valid_fps else iter(())
+    return ", ".join("invalid" if fp is None else f"{next(scores):.4f}" for fp in fps)
 
 @tool
 def get_aromatic_rings(smiles: str) -> str:
     """Returns the number of aromatic rings in the molecule."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    rings = Descriptors.rdMolDescriptors.CalcNumAromaticRings(mol)
-    return f"{rings}"
+    return f"{_bundle(canon)['aromatic_rings']}"
 
 @tool
 def get_molecular_weight(smiles: str) -> str:
     """Returns the Molecular Weight of the molecule."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    mw = Descriptors.MolWt(mol)
-    return f"{mw:.4f}"
+    return f"{_bundle(canon)['mw']:.4f}"
 
 @tool
 def get_tpsa(smiles: str) -> str:
     """Returns the Total Polar Surface Area (TPSA) of the molecule."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    tpsa = Descriptors.TPSA(mol)
-    return f"{tpsa:.4f}"
+    return f"{_bundle(canon)['tpsa']:.4f}"
 
 @tool
 def get_h_bond_donors(smiles: str) -> str:
     """Returns the number of Hydrogen Bond Donors."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    donors = Descriptors.NumHDonors(mol)
-    return f"{donors}"
+    return f"{_bundle(canon)['hbd']}"
 
 @tool
 def get_h_bond_acceptors(smiles: str) -> str:
     """Returns the number of Hydrogen Bond Acceptors."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    acceptors = Descriptors.NumHAcceptors(mol)
-    return f"{acceptors}"
+    return f"{_bundle(canon)['hba']}"
 
 @tool
 def get_rotatable_bonds(smiles: str) -> str:
     """Returns the number of Rotatable Bonds."""
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    bonds = Descriptors.NumRotatableBonds(mol)
-    return f"{bonds}"
+    return f"{_bundle(canon)['rotatable_bonds']}"
 
 @tool
 def get_lipinski_violations(smiles: str) -> str:
@@ -104,37 +307,21 @@ def get_lipinski_violations(smiles: str) -> str:
     Returns the number of Lipinski's Rule of 5 violations.
     Rules: MW <= 500, LogP <= 5, H-Donors <= 5, H-Acceptors <= 10.
     """
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    
-    mw = Descriptors.MolWt(mol)
-    logp = Crippen.MolLogP(mol)
-    donors = Descriptors.NumHDonors(mol)
-    acceptors = Descriptors.NumHAcceptors(mol)
-    
-    violations = 0
-    if mw > 500:
-        violations += 1
-    if logp > 5:
-        violations += 1
-    if donors > 5:
-        violations += 1
-    if acceptors > 10:
-        violations += 1
-        
-    return f"{violations}"
+    return f"{_bundle(canon)['lipinski_violations']}"
+
 @tool
 def get_sa_score(smiles: str) -> str:
     """
     Returns the Synthesizability (SA) Score.
     Ranges from 1 (easy to synthesize) to 10 (hard to synthesize).
     """
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    sa_score = sascorer.calculateScore(mol)
-    return f"{sa_score:.4f}"
+    return f"{_sa(canon):.4f}"
 
 @tool
 def get_qed(smiles: str) -> str:
@@ -142,17 +329,16 @@ def get_qed(smiles: str) -> str:
     Returns the Quantitative Estimate of Drug-likeness (QED) of the molecule.
     The QED score is between 0 (low) and 1 (high).
     """
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
+    canon = _canonical(smiles)
+    if canon is None:
         return "Invalid SMILES"
-    
-    qed_score = QED.qed(mol)
-    return f"{qed_score:.4f}"
+    return f"{_bundle(canon)['qed']:.4f}"
 
 static_tools = [
     get_is_smiles_string_valid,
     get_logp,
     get_similarity,
+    get_similarity_bulk,
     get_aromatic_rings,
     get_molecular_weight,
     get_tpsa,
@@ -166,30 +352,42 @@ static_tools = [
 
 # --- Visualization Helper (Not a tool) ---
 
+def _render_png(mol: Chem.Mol) -> bytes:
+    # Cairo writes the PNG in one native pass -- no PIL round-trip
+    d = rdMolDraw2D.MolDraw2DCairo(300, 300)
+    d.DrawMolecule(mol)
+    d.FinishDrawing()
+    return d.GetDrawingText()
+
+# Blank-canvas placeholder rendered once at import; the invalid branch used
+# to re-run the whole Cairo pipeline for every bad request.
+_INVALID_PNG = _render_png(Chem.Mol())
+
 def visualize_molecule_to_png(smiles: str) -> bytes:
     """
     Generates a PNG image of a molecule from a SMILES string.
     Returns bytes of the PNG.
     """
-    mol = Chem.MolFromSmiles(smiles)
+    mol = _mol(smiles)
+    if mol is None:
+        return _INVALID_PNG
+    return _render_png(mol)
+
+def _render_svg(mol: Chem.Mol) -> str:
+    d = rdMolDraw2D.MolDraw2DSVG(300, 300)
+    d.DrawMolecule(mol)
+    d.FinishDrawing()
+    return d.GetDrawingText()
+
+_INVALID_SVG = _render_svg(Chem.Mol())
+
+def visualize_molecule_to_svg(smiles: str) -> str:
+    """
+    Generates an SVG image of a molecule from a SMILES string.
+    SVG skips Cairo rasterization entirely and is a few KB of
+    well-compressing text, so prefer it where the client allows.
+    """
+    mol = _mol(smiles)
     if mol is None:
-        # Create a placeholder image for invalid SMILES
-        img = Draw.MolToImage(Chem.MolFromSmiles(""), size=(300, 300))
-        d = Draw.Draw2DCANVAS(300, 300, -1, -1)
-        d.drawOptions().addAtomIndices = False
-        d.drawOptions().addStereoAnnotation = False
-        d.SetFontSize(1.2)
-        d.DrawString("Invalid\nSMILES", (100, 150))
-        d.FinishDrawing()
-        img_data = d.GetDrawingText()
-        buffer = io.BytesIO(img_data)
-        return buffer.getvalue()
-        
-    img = Draw.MolToImage(mol, size=(300, 300))
-    
-    # Save image to a bytes buffer
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    
-    return buffer.getvalue()
\ No newline at end of file
+        return _INVALID_SVG
+    return _render_svg(mol)